@@ -0,0 +1,50 @@
+"""
+Compare the per-pair fuzzywuzzy scoring path with the batch matching engine.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_matching
+"""
+import random
+import string
+import timeit
+
+from fuzzywuzzy import fuzz
+
+from metafy.matching import match_matrix
+
+
+# include accented Latin-1 and non-Latin characters, which fuzzywuzzy strips or keeps
+ALPHABET = string.ascii_letters + "&-!'" + "\u00e1\u00e6\u00f3\u00f6\u00df\u00d8\u0153\u0141\u5742\u672c"
+
+
+def random_name(rng: random.Random) -> str:
+    words = rng.randint(1, 5)
+    return " ".join("".join(rng.choice(ALPHABET)
+                            for _ in range(rng.randint(2, 9)))
+                    for _ in range(words))
+
+
+def per_pair(queries, candidates):
+    return [[fuzz.token_set_ratio(q, c) for c in candidates] for q in queries]
+
+
+def batch(queries, candidates):
+    return match_matrix(queries, candidates)
+
+
+def main(num_queries: int=50, num_candidates: int=20, repeat: int=5):
+    rng = random.Random(0)
+    queries = [random_name(rng) for _ in range(num_queries)]
+    candidates = [random_name(rng) for _ in range(num_candidates)]
+
+    # both engines must agree before their timings mean anything
+    assert per_pair(queries, candidates) == batch(queries, candidates).tolist()
+
+    for name, fn in (("per-pair (fuzzywuzzy)", per_pair), ("batch (rapidfuzz cdist)", batch)):
+        best = min(timeit.repeat(lambda: fn(queries, candidates), number=10, repeat=repeat)) / 10
+        print(f"{name:>24}: {best * 1000:8.3f} ms for {num_queries}x{num_candidates} pairs")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
 from dataclasses import dataclass
 
+from .logs import album_logger, album_extra
+
 
 class AlbumSource:
     def __init__(self):
@@ -17,3 +19,20 @@ class Album:
     img: str
     rating: int
     date: str
+
+
+def iter_unique(albums):
+    "Yield albums in order, skipping any title/artist pair that was already seen"
+    seen = set()
+    for album in albums:
+        album_logger.debug("album: %s", album, extra=album_extra(album.title, album.artist))
+        key = f"{album.title}:{album.artist}"
+        if key in seen:
+            album_logger.debug("Removing duplicate album %s", album, extra=album_extra(album.title, album.artist))
+            continue
+        seen.add(key)
+        yield album
+
+
+def remove_duplicates(albums):
+    return list(iter_unique(albums))
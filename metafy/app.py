@@ -1,77 +1,189 @@
 import os
-import logging
+import uuid
 from datetime import datetime as dt
 from collections import defaultdict
+from .albums import remove_duplicates
 from .scraper import Scraper
-from .metacritic import MetacriticSource
-from .spotify import Spotify
+from .metacritic import MetacriticSource, acquire_user_agent
+from .spotify import Spotify, SpotifyAlbum
+from .history import History
+from .profiling import profiled, profiling_requested
+from .queues import queue_from_url
+from .fanout import enqueue_albums, resolve_in_parallel, aggregate
+from .logs import logger, album_logger, album_extra, configure_logging, flush_logging, logging_settings
 from .pitchfork import PitchforkSource
+from . import session
 
 
 version = "0.1.1"
-logger = logging.getLogger("metafy")
-logger.setLevel(logging.DEBUG)
-logging.StreamHandler().setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
 
+# Settings the cached clients depend on.  If any of them differ from the
+# previous invocation of a warm container everything is rebuilt.
+WARM_CONFIG = ("ENVIRONMENT_TYPE", "SPOTIFY_CLIENT_ID", "SPOTIFY_CLIENT_SECRET", "SPOTIFY_REF_TK",
+               "SPOTIFY_PLAYLIST_ID", "METAFY_PLAYLIST_MIRROR", "METAFY_REVIEW_CACHE")
 
-def remove_duplicates(albums):
-    table = dict()
-    for album in albums:
-        logger.info(f"album: {album}")
-        key = f"{album.title}:{album.artist}"
-        if key in table:
-            logging.debug(f"Removing duplicate album {album}")
-            continue
-        table[key] = album
-
-    return [v for _, v in table.items()]
+# clients kept alive between invocations of a warm Lambda container
+_warm = {}
 
 
 def lambda_handler(e, ctx):
-    logger.info("Scraping metacritic")
     env = os.environ
+    configure_logging(*logging_settings(env))
+    profile = profiling_requested(e, env)
+    mode = e.get("mode") if isinstance(e, dict) else None
+    if mode is not None and mode not in SPLIT_MODES:
+        raise ValueError(f"Unknown mode: {mode}")
+
+    invocation = prepare_container(env)
+    logger.info("Starting %s invocation", invocation)
+
+    try:
+        with profiled(profile, env.get("METAFY_PROFILE_OUTPUT")) as summary:
+            result = SPLIT_MODES[mode](env, e) if mode else run(env)
+    finally:
+        # the container may be frozen as soon as we return so write out pending records
+        flush_logging()
+
+    result["invocation"] = invocation
+    if profile:
+        result["profile"] = summary
+    return result
+
+
+def prepare_container(env) -> str:
+    """
+    Return "warm" if the clients cached by an earlier invocation can be reused,
+    otherwise drop them and return "cold"
+    """
+    config = tuple(env.get(k) for k in WARM_CONFIG)
+    if _warm.get("config") == config:
+        return "warm"
+
+    reset_container()
+    _warm["config"] = config
+    return "cold"
+
+
+def reset_container():
+    "Forget every client, connection pool and cache kept between invocations"
+    _warm.clear()
+    session.reset()
+    acquire_user_agent.cache_clear()
+
+
+def make_spotify(env):
+    "Return the Spotify client, creating it on first use"
+    if "spotify" not in _warm:
+        _warm["spotify"] = build_spotify(env)
+    return _warm["spotify"]
+
+
+def build_spotify(env):
+    "Return a new Spotify client, or a stand-in that does nothing outside of prod"
+    if env["ENVIRONMENT_TYPE"] == "prod":
+        return Spotify(env["SPOTIFY_PLAYLIST_ID"], env.get("METAFY_PLAYLIST_MIRROR"))
 
-    logger.debug(f"Launched with environment:\n{env}")
+    class MockSpotify:
+        def clear_playlist(self): pass
+
+        def search_for_album(self, title, artist=None): return None
+
+        def get_tracks_from_album(self, hit): pass
+
+        def add_tracks_to_playlist(self, tracks): pass
+
+        def update_playlist_description(self, descr): pass
+    return MockSpotify()
 
-    if env["ENVIRONMENT_TYPE"] == "prod":
-        api = Spotify(env["SPOTIFY_PLAYLIST_ID"])
-    else:
-        class MockSpotify:
-            def clear_playlist(self): pass
 
-            def search_for_album(self, query): return None
+def scrape(env):
+    if "scraper" not in _warm:
+        scraper = Scraper()
+        scraper.register_source(MetacriticSource())
+        scraper.register_source(PitchforkSource(env.get("METAFY_REVIEW_CACHE")))
+        _warm["scraper"] = scraper
+    return remove_duplicates(list(_warm["scraper"].scrape()))
 
-            def get_tracks_from_album(self, hit): pass
 
-            def add_tracks_to_playlist(self, tracks): pass
+def playlist_description():
+    return f"""(Updated {dt.strftime(dt.today(), '%b %d %Y')}). \
+This playlist was created using a script written by Matt Hosack.  The new \
+release page from metacritic.com was scraped and albums realeased more \
+recently than a week ago that scored higher than 80 were \
+added to this playlist. \
+See github.com/hosackm/metacritic-playlist-gen for more info."""
+
+
+def run(env):
+    logger.info("Scraping metacritic")
 
-            def update_playlist_description(self, descr): pass
-        api = MockSpotify()
+    logger.debug("Launched with environment variables: %s", ", ".join(sorted(env)))
 
-    scraper = Scraper()
-    scraper.register_source(MetacriticSource())
-    scraper.register_source(PitchforkSource())
+    api = make_spotify(env)
 
     logger.info("Clearing playlist")
     api.clear_playlist()
 
-    albums = remove_duplicates(list(scraper.scrape()))
+    # optionally remember what previous runs resolved so unchanged albums skip the search
+    history = History(env["METAFY_HISTORY_DB"]) if env.get("METAFY_HISTORY_DB") else None
+
+    albums = scrape(env)
     for album in albums:
-        logger.info(f"Processing: {album}")
-        query = f"{album.title} {album.artist}"
-        logger.debug(f"Searching for ({album.source}): {query}")
-        hit = api.search_for_album(query)
+        extra = album_extra(album.title, album.artist)
+        album_logger.info("Processing: %s", album, extra=extra)
+        if history and not history.changed(album):
+            album_logger.debug("Reusing previous result for: %s %s", album.title, album.artist, extra=extra)
+            spotify_id = history.get(album).spotify_id
+            hit = SpotifyAlbum(album.artist, album.title, spotify_id) if spotify_id else None
+        else:
+            album_logger.debug("Searching for (%s): %s %s", album.source, album.title, album.artist, extra=extra)
+            hit = api.search_for_album(album.title, album.artist)
+            if history:
+                history.record(album, hit.album_id if hit else None)
         if hit:
-            logger.debug(f"Found {query}. Adding to playlist")
+            album_logger.debug("Found %s %s. Adding to playlist", album.title, album.artist, extra=extra)
             tracks = api.get_tracks_from_album(hit)
             api.add_tracks_to_playlist(tracks)
 
-    description = f"""(Updated {dt.strftime(dt.today(), '%b %d %Y')}). \
-This playlist was created using a script written by Matt Hosack.  The new \
-release page from metacritic.com was scraped and albums realeased more \
-recently than a week ago that scored higher than 80 were \
-added to this playlist. \
-See github.com/hosackm/metacritic-playlist-gen for more info."""
-    api.update_playlist_description(description)
+    api.update_playlist_description(playlist_description())
+
+    if history:
+        history.close()
 
     return {"status": "completed successfully"}
+
+
+# Split mode spreads one run over several invocations that share queues given by
+# METAFY_WORK_QUEUE and METAFY_RESULT_QUEUE (file://<dir>, an SQS queue URL or,
+# when every stage runs in one process, memory://<name>):
+# one "enqueue" run, any number of "resolve" runs and a final "aggregate" run,
+# whose event must carry the run_id and expected count that "enqueue" returned.
+
+def run_enqueue(env, event):
+    run_id = uuid.uuid4().hex
+    n = enqueue_albums(scrape(env), queue_from_url(env["METAFY_WORK_QUEUE"]), run_id)
+    return {"status": "completed successfully", "run_id": run_id, "expected": n}
+
+
+def run_resolve(env, event):
+    n = resolve_in_parallel(make_spotify(env),
+                            queue_from_url(env["METAFY_WORK_QUEUE"]),
+                            queue_from_url(env["METAFY_RESULT_QUEUE"]),
+                            workers=int(env.get("METAFY_RESOLVE_WORKERS", 4)))
+    return {"status": "completed successfully", "resolved": n}
+
+
+def run_aggregate(env, event):
+    n = aggregate(make_spotify(env),
+                  queue_from_url(env["METAFY_RESULT_QUEUE"]),
+                  playlist_description(),
+                  event["run_id"],
+                  int(event["expected"]))
+    return {"status": "completed successfully", "tracks": n}
+
+
+SPLIT_MODES = {
+    "enqueue": run_enqueue,
+    "resolve": run_resolve,
+    "aggregate": run_aggregate,
+}
@@ -0,0 +1,124 @@
+import json
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from dataclasses import asdict
+from datetime import datetime as dt
+from typing import List, Optional, Tuple
+
+import click
+
+from .albums import Album, iter_unique
+from .metacritic import MetacriticSource, DetailedMetacriticSource, in_window
+from .pitchfork import PitchforkSource
+from .profiling import profiled
+from .logs import configure_logging, configure_worker_logging, logging_settings
+
+
+SOURCES = {
+    "metacritic": MetacriticSource,
+    "metacritic_detailed": DetailedMetacriticSource,
+    "pitchfork": PitchforkSource,
+}
+
+# snapshots are named <source>-<YYYY-MM-DD>.html, e.g. pitchfork-2020-04-03.html
+SNAPSHOT_NAME = re.compile(r"^(?P<source>{})-(?P<date>\d{{4}}-\d{{2}}-\d{{2}})\.html?$".format(
+    "|".join(SOURCES)))
+
+
+def parse_snapshot_name(filename: str) -> Optional[Tuple[str, dt]]:
+    "Return the source key and snapshot date encoded in a snapshot's filename"
+    m = SNAPSHOT_NAME.match(filename)
+    if not m:
+        return None
+    return m.group("source"), dt.strptime(m.group("date"), "%Y-%m-%d")
+
+
+def find_snapshots(directory: str) -> List[str]:
+    "Return the snapshot files in a directory sorted by date and then name"
+    names = [n for n in os.listdir(directory) if parse_snapshot_name(n)]
+    return [os.path.join(directory, n)
+            for n in sorted(names, key=lambda n: (parse_snapshot_name(n)[1], n))]
+
+
+def parse_snapshot(path: str, days: int=7, min_rating: int=80) -> List[Album]:
+    """
+    Parse a single archived page and return the albums inside the filter window
+    ending on the snapshot's date.  Runs inside a worker process.
+    """
+    key, now = parse_snapshot_name(os.path.basename(path))
+    source = SOURCES[key]()
+
+    with open(path, "rb") as f:
+        content = f.read()
+
+    if isinstance(source, DetailedMetacriticSource):
+        parsed = source.parse(content)
+    else:
+        parsed = source.parse(content, now)
+
+    return [Album(title=a["title"], artist=a["artist"], source=source.name,
+                  img=a.get("img", "https://via.placeholder.com/98"),
+                  rating=a["rating"], date=a["date"])
+            for a in parsed if in_window(a, now, days, min_rating)]
+
+
+@click.group()
+def cli():
+    "Metafy command line tools"
+    configure_logging(*logging_settings(os.environ))
+
+
+@cli.command()
+@click.argument("directory", type=click.Path(exists=True, file_okay=False))
+@click.option("--days", default=7, show_default=True,
+              help="Length of the release date window ending on each snapshot's date.")
+@click.option("--min-rating", default=80, show_default=True,
+              help="Lowest rating an album may have.")
+@click.option("--workers", type=int, default=None,
+              help="Number of parser processes (defaults to the number of CPUs, 0 parses in-process).")
+@click.option("--output", "-o", type=click.File("w"), default="-",
+              help="File to write JSON lines to (defaults to stdout).")
+@click.option("--profile", "profile_output", type=click.Path(dir_okay=False), default=None,
+              help="Profile an in-process run and write cProfile stats to this file.")
+def backfill(directory, days, min_rating, workers, output, profile_output):
+    """
+    Parse archived Metacritic and Pitchfork pages in DIRECTORY and stream the
+    deduplicated albums as JSON lines.
+
+    Snapshots must be named <source>-<YYYY-MM-DD>.html where source is one of
+    metacritic, metacritic_detailed or pitchfork.
+    """
+    paths = find_snapshots(directory)
+    if not paths:
+        raise click.ClickException(f"No snapshots found in {directory}")
+
+    # cProfile only sees the process it runs in, so profiled runs parse in-process
+    if profile_output is not None:
+        workers = 0
+
+    with profiled(profile_output is not None, profile_output) as summary, ExitStack() as stack:
+        if workers == 0:
+            parse = map
+        else:
+            pool = stack.enter_context(ProcessPoolExecutor(max_workers=workers,
+                                                           initializer=configure_worker_logging,
+                                                           initargs=logging_settings(os.environ)))
+            parse = pool.map
+        results = parse(parse_snapshot, paths, [days] * len(paths), [min_rating] * len(paths))
+        albums = (album for snapshot in results for album in snapshot)
+        for album in iter_unique(albums):
+            output.write(json.dumps(asdict(album)) + "\n")
+
+    if summary:
+        click.echo(json.dumps(summary, indent=2), err=True)
+
+
+def main():
+    cli(prog_name="metafy")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from typing import Iterable, List
+
+from .albums import Album
+from .queues import WorkQueue, WorkItem
+from .logs import logger, album_logger, album_extra
+from .spotify import SpotifyTrack
+
+# Spotify accepts at most 100 track URIs per add request
+MAX_TRACKS_PER_WRITE = 100
+
+
+def enqueue_albums(albums: Iterable[Album], work: WorkQueue, run_id: str) -> int:
+    """
+    Put every album on the work queue tagged with the run it belongs to and
+    return how many were enqueued.  The position is kept so the aggregator can
+    restore the scraped order.
+    """
+    n = 0
+    for n, album in enumerate(albums, 1):
+        work.put({"run_id": run_id, "index": n - 1, "album": asdict(album)})
+    return n
+
+
+def resolve_albums(api, work: WorkQueue, results: WorkQueue) -> int:
+    """
+    Resolve albums from the work queue until it is empty and publish the tracks
+    found for each one to the results queue.  Returns the number of items handled.
+    """
+    handled = 0
+    while True:
+        item = work.get()
+        if item is None:
+            return handled
+
+        album = item.body["album"]
+        album_logger.debug("Resolving (%s): %s %s", album["source"], album["title"], album["artist"],
+                           extra=album_extra(album["title"], album["artist"]))
+        try:
+            hit = api.search_for_album(album["title"], album["artist"])
+            tracks = (api.get_tracks_from_album(hit) or []) if hit else []
+
+            results.put({"run_id": item.body["run_id"],
+                         "index": item.body["index"],
+                         "album": album,
+                         "tracks": [t.__dict__ for t in tracks]})
+        except Exception:
+            # hand the item back so a retry can claim it instead of waiting out a lease
+            work.release(item)
+            raise
+        work.done(item)
+        handled += 1
+
+
+def resolve_in_parallel(api, work: WorkQueue, results: WorkQueue, workers: int=4) -> int:
+    "Run several resolvers against the same queues in threads"
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        counts = [pool.submit(resolve_albums, api, work, results) for _ in range(workers)]
+        return sum(c.result() for c in counts)
+
+
+def collect_results(results: WorkQueue) -> List[WorkItem]:
+    "Drain the results queue without acknowledging anything"
+    items = []
+    while True:
+        item = results.get()
+        if item is None:
+            return items
+        items.append(item)
+
+
+def aggregate(api, results: WorkQueue, description: str, run_id: str, expected: int) -> int:
+    """
+    Replace the playlist contents with every track resolved for a run in as few
+    writes as possible and return the number of tracks written.
+
+    Nothing is written until a result has arrived for each of the `expected`
+    albums of the run.  Results are only acknowledged once the playlist has been
+    written, otherwise they are handed back to the queue for the next attempt.
+    Results left over from other runs are discarded.
+    """
+    items, by_index = [], {}
+    for item in collect_results(results):
+        if item.body.get("run_id") != run_id:
+            logger.warning("Discarding result from run %s", item.body.get("run_id"))
+            results.done(item)
+            continue
+        items.append(item)
+        # redelivered results are duplicates of the same album
+        by_index.setdefault(item.body["index"], item.body)
+
+    if len(by_index) != expected:
+        for item in items:
+            results.release(item)
+        raise Exception(f"Only {len(by_index)} of {expected} results for run {run_id} are ready")
+
+    bodies = [by_index[i] for i in sorted(by_index)]
+    tracks = [SpotifyTrack(**t) for body in bodies for t in body["tracks"]]
+
+    try:
+        logger.info("Clearing playlist")
+        api.clear_playlist()
+        for i in range(0, len(tracks), MAX_TRACKS_PER_WRITE):
+            api.add_tracks_to_playlist(tracks[i:i + MAX_TRACKS_PER_WRITE])
+        api.update_playlist_description(description)
+    except Exception:
+        for item in items:
+            results.release(item)
+        raise
+
+    for item in items:
+        results.done(item)
+    return len(tracks)
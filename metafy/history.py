@@ -0,0 +1,111 @@
+import sqlite3
+from dataclasses import dataclass
+from datetime import datetime as dt
+from typing import Optional, List
+
+from .albums import Album
+from .matching import normalize
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS albums (
+    artist_key TEXT NOT NULL,
+    title_key TEXT NOT NULL,
+    artist TEXT NOT NULL,
+    title TEXT NOT NULL,
+    source TEXT NOT NULL,
+    rating INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    spotify_id TEXT,
+    week TEXT NOT NULL,
+    PRIMARY KEY (artist_key, title_key)
+);
+CREATE INDEX IF NOT EXISTS albums_week ON albums (week);
+CREATE INDEX IF NOT EXISTS albums_date ON albums (date);
+"""
+
+
+def current_week() -> str:
+    "Return the ISO week (e.g. 2020-W14) that a run happening now belongs to"
+    return dt.now().strftime("%G-W%V")
+
+
+@dataclass
+class HistoryRecord:
+    artist: str
+    title: str
+    source: str
+    rating: int
+    date: str
+    spotify_id: Optional[str]
+    week: str
+
+
+class History:
+    """
+    Local SQLite store of every album a run has processed and what it resolved to.
+
+    Albums are keyed on their normalized artist and title so the same release
+    scraped from different sources (or with different punctuation) maps to one row.
+    """
+    def __init__(self, path: str=":memory:"):
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    @staticmethod
+    def key(album: Album):
+        artist, title = normalize([album.artist, album.title])
+        return artist, title
+
+    def get(self, album: Album) -> Optional[HistoryRecord]:
+        """
+        Return the stored record for an album or None if it was never processed
+        """
+        row = self.conn.execute(
+            "SELECT artist, title, source, rating, date, spotify_id, week FROM albums "
+            "WHERE artist_key = ? AND title_key = ?", self.key(album)).fetchone()
+        return HistoryRecord(*row) if row else None
+
+    def changed(self, album: Album) -> bool:
+        """
+        Return True if the album is new, its rating or date changed since it was recorded,
+        or it wasn't found on Spotify last time (it may have been released there since)
+        """
+        record = self.get(album)
+        return (record is None or record.spotify_id is None or
+                record.rating != album.rating or record.date != str(album.date))
+
+    def record(self, album: Album, spotify_id: Optional[str], week: Optional[str]=None):
+        """
+        Store (or update) an album along with the Spotify album it resolved to.
+
+        An album keeps the week it was first found on Spotify in, later updates to
+        its rating or date don't move it to another week.
+        """
+        week = week or current_week()
+        # two statements rather than an upsert, ON CONFLICT needs SQLite 3.24+ which
+        # the Python 3.7 Lambda runtime doesn't ship
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO albums VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (*self.key(album), album.artist, album.title, str(album.source),
+                 album.rating, str(album.date), spotify_id, week))
+            # SET expressions see the row's previous values
+            self.conn.execute(
+                "UPDATE albums SET artist = ?, title = ?, source = ?, rating = ?, date = ?, "
+                "week = CASE WHEN spotify_id IS NULL THEN ? ELSE week END, spotify_id = ? "
+                "WHERE artist_key = ? AND title_key = ?",
+                (album.artist, album.title, str(album.source), album.rating, str(album.date),
+                 week, spotify_id, *self.key(album)))
+
+    def added_in_week(self, week: str) -> List[HistoryRecord]:
+        """
+        Return the albums recorded in the given ISO week that were found on Spotify
+        """
+        rows = self.conn.execute(
+            "SELECT artist, title, source, rating, date, spotify_id, week FROM albums "
+            "WHERE week = ? AND spotify_id IS NOT NULL ORDER BY artist, title", (week,))
+        return [HistoryRecord(*row) for row in rows]
@@ -0,0 +1,113 @@
+import atexit
+import logging
+import queue
+import threading
+import zlib
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional, Tuple
+
+
+FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+logger = logging.getLogger("metafy")
+# per-album records go through this child logger so they can be sampled
+album_logger = logging.getLogger("metafy.albums")
+
+_log_queue = queue.Queue()
+_listener = None  # type: Optional[QueueListener]
+_lock = threading.Lock()
+
+
+def album_extra(title: str, artist: str) -> Dict:
+    "Return the `extra` for a per-album record so every record of an album is sampled alike"
+    return {"album_key": f"{title}:{artist}"}
+
+
+class SampleFilter(logging.Filter):
+    """
+    Keep every record of roughly one in `every` albums.
+
+    The decision is made from a stable hash of the record's album_key so all the
+    records logged for one album are either kept or dropped together.  Records
+    without an album_key are always kept.
+    """
+    def __init__(self, every: int=1):
+        super().__init__()
+        self.every = max(1, every)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = getattr(record, "album_key", None)
+        if key is None:
+            return True
+        return zlib.crc32(key.encode("utf8")) % self.every == 0
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    QueueHandler that leaves formatting to the listener's thread.
+
+    The stock handler formats every record before queueing it, this one queues
+    the record untouched so message interpolation happens off the hot path.
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def logging_settings(env: Dict) -> Tuple[str, int]:
+    "Return the log level and album sampling rate configured in an environment"
+    return env.get("METAFY_LOG_LEVEL", "INFO"), int(env.get("METAFY_LOG_SAMPLE", 1))
+
+
+def _apply_settings(level: str, sample_every: int):
+    logger.setLevel(level)
+    for f in list(album_logger.filters):
+        album_logger.removeFilter(f)
+    if sample_every > 1:
+        album_logger.addFilter(SampleFilter(sample_every))
+
+
+def configure_logging(level: str="INFO", sample_every: int=1):
+    """
+    Send metafy's records to a background thread that writes them to stderr.
+
+    Safe to call more than once, later calls only update the level and sampling.
+    """
+    global _listener
+    with _lock:
+        _apply_settings(level, sample_every)
+        if _listener is not None:
+            return
+
+        stream = logging.StreamHandler()
+        stream.setFormatter(logging.Formatter(FORMAT))
+        _listener = QueueListener(_log_queue, stream, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+        logger.addHandler(DeferredQueueHandler(_log_queue))
+        logger.propagate = False
+
+
+def configure_worker_logging(level: str="INFO", sample_every: int=1):
+    """
+    Write metafy's records straight to stderr from a worker process.
+
+    A forked worker inherits the parent's queue handler but not the listener
+    thread that drains it, so anything queued there would never be written.
+    """
+    global _listener
+    _listener = None
+    for h in list(logger.handlers):
+        logger.removeHandler(h)
+
+    stream = logging.StreamHandler()
+    stream.setFormatter(logging.Formatter(FORMAT))
+    logger.addHandler(stream)
+    logger.propagate = False
+    _apply_settings(level, sample_every)
+
+
+def flush_logging():
+    "Block until every queued record has been written"
+    if _listener is not None:
+        _log_queue.join()
@@ -0,0 +1,33 @@
+from typing import List
+
+import numpy as np
+from rapidfuzz import fuzz, process, utils
+
+
+# fuzzywuzzy's token_set_ratio runs full_process(force_ascii=True), which deletes
+# the Latin-1 range (chr 128-255) before anything else
+LATIN1_TABLE = {i: None for i in range(128, 256)}
+
+
+def normalize(strings: List[str]) -> List[str]:
+    """
+    Drop Latin-1 characters, lowercase, strip non-alphanumerics and trim whitespace
+    the same way fuzzywuzzy's full_process(force_ascii=True) does so scores are comparable
+    """
+    return [utils.default_process(s.translate(LATIN1_TABLE)) for s in strings]
+
+
+def match_matrix(queries: List[str], candidates: List[str]) -> np.ndarray:
+    """
+    Return a (queries x candidates) matrix of token set ratios in the range 0-100.
+
+    Every string is normalized once and the whole matrix is scored in a single
+    call.  Scores are rounded to integers to match fuzzywuzzy.fuzz.token_set_ratio
+    """
+    if not queries or not candidates:
+        return np.zeros((len(queries), len(candidates)), dtype=np.int32)
+
+    scores = process.cdist(normalize(queries),
+                           normalize(candidates),
+                           scorer=fuzz.token_set_ratio)
+    return np.rint(scores).astype(np.int32)
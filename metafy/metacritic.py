@@ -1,6 +1,5 @@
 import time
-import logging
-import requests
+from functools import lru_cache
 from random import choice
 from datetime import datetime as dt, timedelta as td
 from typing import Optional, Type, Union, List, Generator, Dict
@@ -8,34 +7,42 @@ from typing import Optional, Type, Union, List, Generator, Dict
 from bs4 import BeautifulSoup
 
 from .albums import AlbumSource, Album
+from .logs import logger
+from .session import get_session, cached_page
 
 
 MONTH_DAY_YEAR_FMT = "%b %d %Y"
+# how long a parsed page may be reused by later invocations of a warm container
+PAGE_CACHE_SECONDS = 900
 FULL_MONTH_COMMA_DAY_YEAR_FMT = "%B %d, %Y"
-logger = logging.getLogger("metafy")
 
 
+@lru_cache(maxsize=1)
 def acquire_user_agent():
     "Return a User Agent that metacritic won't expect a scraper to use"
     url = "https://www.whatismybrowser.com/guides/the-latest-user-agent/chrome"
-    resp = requests.get(url)
+    resp = get_session().get(url)
     return choice([a.text
                    for a in BeautifulSoup(
                        resp.content, "html.parser").select("span.code")])
 
 
-def gt_80_lt_1_week(album: Dict) -> bool:
-    "Return True if the album was released in the past week"
-    now = dt.now()
-    weekago = now - td(days=7)
+def in_window(album: Dict, now: dt, days: int=7, min_rating: int=80) -> bool:
+    "Return True if the album was released in the `days` before `now` and rated at least `min_rating`"
+    start = now - td(days=days)
     date = dt.strptime(album["date"], MONTH_DAY_YEAR_FMT)
 
-    # older than now, newer than a week ago, and gte to 80
-    if date <= now and date >= weekago and album["rating"] >= 80:
+    # older than now, newer than the start of the window, and gte to min_rating
+    if date <= now and date >= start and album["rating"] >= min_rating:
         return True
     return False
 
 
+def gt_80_lt_1_week(album: Dict) -> bool:
+    "Return True if the album was released in the past week"
+    return in_window(album, dt.now())
+
+
 class MetacriticSource(AlbumSource):
     URL = "https://www.metacritic.com/browse/albums/release-date/new-releases/date"
 
@@ -45,12 +52,12 @@ class MetacriticSource(AlbumSource):
 
     def get_html(self, retries: int=3) -> bytes:
         "Return the HTML content from metacritic's new releases page"
-        rsp = requests.get(self.URL, headers={"User-Agent": f"{acquire_user_agent()}"})
+        rsp = get_session().get(self.URL, headers={"User-Agent": f"{acquire_user_agent()}"})
 
         if rsp.status_code == 429:
             if retries > 0:
                 t = int(rsp.headers.get("Retry-After", 5))
-                logger.info(f"Sleeping {t} seconds and retrying")
+                logger.info("Sleeping %s seconds and retrying", t)
                 time.sleep(t)
                 self.get_html(retries=retries-1)
             raise Exception("Rate limitation exceeeded. Try again later.")
@@ -61,13 +68,13 @@ class MetacriticSource(AlbumSource):
 
         return rsp.content
 
-    def deduce_and_replace_year(self, month_and_day: str) -> str:
+    def deduce_and_replace_year(self, month_and_day: str, now: Optional[dt]=None) -> str:
         """
         Given a month and a day this function will deduce the year and place it into the
         date formatted string.  Albums that come from a different year must be handled
-        properly.
+        properly.  `now` is the date the page was scraped on and defaults to today.
         """
-        now = dt.now()
+        now = now or dt.now()
         # can't create a datetime on a leap day without the correct year specified
         # good thing I developed this on a leap year...
         if month_and_day == "Feb 29":
@@ -88,7 +95,8 @@ class MetacriticSource(AlbumSource):
     def strip_select_as_type(self,
                              soup,
                              selector: str,
-                             as_type: Optional[Type]=None) -> Union[int, dt, str]:
+                             as_type: Optional[Type]=None,
+                             now: Optional[dt]=None) -> Union[int, dt, str]:
         """
         Given a Soup object return the first instance of CSS selector,
         strip the text, and perform an optional type casting
@@ -102,15 +110,15 @@ class MetacriticSource(AlbumSource):
             except ValueError:
                 return 0  # "tbd" is an acceptible value for score
         elif as_type == dt:
-            return self.deduce_and_replace_year(text)
+            return self.deduce_and_replace_year(text, now)
         return text
 
-    def parse(self, text: bytes) -> List[Dict]:
+    def parse(self, text: bytes, now: Optional[dt]=None) -> List[Dict]:
         "Parse out album information from the provided HTML string"
         soup = BeautifulSoup(text, "html.parser")
         return [
             {
-                "date": self.strip_select_as_type(p, "li.release_date", dt),
+                "date": self.strip_select_as_type(p, "li.release_date", dt, now),
                 "rating": self.strip_select_as_type(p, "div.metascore_w", int),
                 "title": self.strip_select_as_type(p, "div.product_title > a"),
                 "artist": self.strip_select_as_type(p, "li.product_artist > span.data")
@@ -118,7 +126,8 @@ class MetacriticSource(AlbumSource):
         ]
 
     def gen_albums(self):
-        for a in filter(gt_80_lt_1_week, self.parse(self.get_html())):
+        parsed = cached_page(self.URL, PAGE_CACHE_SECONDS, lambda: self.parse(self.get_html()))
+        for a in filter(gt_80_lt_1_week, parsed):
             yield Album(**a, source=self.name, img="https://via.placeholder.com/98")
             # yield Album(title=a["title"], artist=a["artist"], source=self.name,
             #             img="https://via.placeholder.com/98", rating=a["rating"], date=a["date"])
@@ -133,7 +142,7 @@ class DetailedMetacriticSource(AlbumSource):
 
     def get_html(self):
         headers = {"User-Agent": acquire_user_agent()}
-        return requests.get(self.URL, headers=headers).content
+        return get_session().get(self.URL, headers=headers).content
 
     def normalize_date(self, date: str) -> str:
         """
@@ -178,7 +187,8 @@ class DetailedMetacriticSource(AlbumSource):
         return albums
 
     def gen_albums(self):
-        for a in filter(gt_80_lt_1_week, self.parse(self.get_html())):
+        parsed = cached_page(self.URL, PAGE_CACHE_SECONDS, lambda: self.parse(self.get_html()))
+        for a in filter(gt_80_lt_1_week, parsed):
             yield Album(**a, source=self.name)
             # yield Album(title=a["title"], artist=a["artist"], source=self.name,
             #             img=a["img"], rating=a["score"], date=a["date"])
@@ -1,24 +1,65 @@
-import requests
-from typing import List, Dict
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional
 from datetime import datetime as dt
 from urllib.parse import unquote
 from metafy.albums import AlbumSource, Album
+from metafy.metacritic import gt_80_lt_1_week, MONTH_DAY_YEAR_FMT, PAGE_CACHE_SECONDS
+from metafy.logs import logger
+from metafy.session import get_session, cached_page
 
 from bs4 import BeautifulSoup
 
 
+class ReviewCache:
+    """
+    Rating and date scraped from each review page keyed by the review's URL.
+
+    When a path is given the cache is persisted as JSON so reviews fetched by
+    earlier runs are never fetched again.
+    """
+    def __init__(self, path: Optional[str]=None):
+        self.path = path
+        self.reviews = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self.reviews = json.load(f)
+            except ValueError:
+                # a corrupt cache is just a cache miss
+                self.reviews = {}
+
+    def __contains__(self, url: str) -> bool:
+        return url in self.reviews
+
+    def __getitem__(self, url: str) -> Dict:
+        return self.reviews[url]
+
+    def __setitem__(self, url: str, review: Dict):
+        self.reviews[url] = review
+
+    def save(self):
+        if not self.path:
+            return
+        with open(self.path, "w") as f:
+            json.dump(self.reviews, f)
+
+
 class PitchforkSource(AlbumSource):
     URL = "https://pitchfork.com/best"
 
-    def __init__(self):
+    def __init__(self, review_cache_path: Optional[str]=None, max_concurrency: int=8):
         super().__init__()
         self.name = "Pitchfork Source"
+        self.review_cache = ReviewCache(review_cache_path)
+        self.max_concurrency = max_concurrency
 
-    def get_html(self) -> bytes:
-        resp = requests.get(self.URL)
+    def get_html(self, url: Optional[str]=None) -> bytes:
+        resp = get_session().get(url or self.URL)
         return resp.content
 
-    def parse(self, content: bytes) -> List[Dict]:
+    def parse(self, content: bytes, now: Optional[dt]=None) -> List[Dict]:
         soup = BeautifulSoup(content, "html.parser")
         section = soup.select("#best-new-albums")[0]
         albums_html = section.select("ul li div a")
@@ -34,11 +75,56 @@ class PitchforkSource(AlbumSource):
             albums.append({"img": img,
                            "artist": artist,
                            "title": title,
-                           "date": dt.now(),  # date information isn't available on this page
-                           "rating": 100})  # rating isn't available but we know it's recommended by Pitchfork
+                           "url": a.get("href"),
+                           # neither is available on this page, enrich() fetches the real values
+                           "date": dt.strftime(now or dt.now(), MONTH_DAY_YEAR_FMT),
+                           "rating": 100})
         return albums
 
+    def parse_review(self, content: bytes) -> Dict:
+        """
+        Parse the score (scaled to 0-100) and publish date out of a review page
+        """
+        soup = BeautifulSoup(content, "html.parser")
+
+        score = soup.select("span.score") or soup.select("[class*=Rating]")
+        rating = int(round(float(score[0].text.strip()) * 10))
+
+        published = soup.select("time[datetime]")
+        if published:
+            date = published[0]["datetime"]
+        else:
+            date = soup.select("meta[property='article:published_time']")[0]["content"]
+        date = dt.strptime(date[:10], "%Y-%m-%d")
+
+        return {"rating": rating, "date": dt.strftime(date, MONTH_DAY_YEAR_FMT)}
+
+    def fetch_review(self, url: str) -> Optional[Dict]:
+        try:
+            return self.parse_review(self.get_html(url))
+        except Exception as e:
+            logger.warning("Unable to read Pitchfork review %s: %s", url, e)
+            return None
+
+    def enrich(self, albums: List[Dict]) -> List[Dict]:
+        """
+        Replace the placeholder rating and date of each album with the values
+        from its review page.  Uncached reviews are fetched concurrently and
+        albums whose review can't be read are dropped, since their placeholders
+        would always pass the rating and date filter.
+        """
+        urls = {a["url"] for a in albums if a.get("url") and a["url"] not in self.review_cache}
+        if urls:
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+                for url, review in zip(urls, pool.map(self.fetch_review, urls)):
+                    if review:
+                        self.review_cache[url] = review
+            self.review_cache.save()
+
+        return [{**a, **self.review_cache[a["url"]]} for a in albums if a.get("url") in self.review_cache]
+
     def gen_albums(self):
-        for a in self.parse(self.get_html()):
+        parsed = cached_page(self.URL, PAGE_CACHE_SECONDS, lambda: self.parse(self.get_html()))
+        for a in filter(gt_80_lt_1_week, self.enrich(parsed)):
             yield Album(title=a["title"], artist=a["artist"], source=self.name,
-                        img=a["img"], rating=100, date=a["date"])
+                        img=a["img"], rating=a["rating"], date=a["date"])
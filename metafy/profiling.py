@@ -0,0 +1,65 @@
+import cProfile
+import pstats
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+
+TRUTHY = ("1", "true", "yes", "on")
+
+
+def profiling_requested(event: Optional[Dict], env: Dict) -> bool:
+    """
+    Return True if profiling was asked for by a handler event flag or METAFY_PROFILE
+    """
+    if isinstance(event, dict) and event.get("profile"):
+        return True
+    return env.get("METAFY_PROFILE", "").lower() in TRUTHY
+
+
+def top_functions(stats: pstats.Stats, limit: int=15) -> List[Dict]:
+    "Return the functions with the highest cumulative time from profiler stats"
+    rows = sorted(stats.stats.items(), key=lambda kv: kv[1][3], reverse=True)[:limit]
+    return [{"function": "{}:{}({})".format(*func),
+             "calls": nc,
+             "total_seconds": round(tt, 6),
+             "cumulative_seconds": round(ct, 6)}
+            for func, (cc, nc, tt, ct, callers) in rows]
+
+
+@contextmanager
+def profiled(enabled: bool, output: Optional[str]=None, limit: int=15):
+    """
+    Capture cProfile call stats and tracemalloc peak memory for the enclosed block.
+
+    Yields a dict that is filled in with a summary once the block exits.  Raw
+    profiler stats are written to `output` (readable with pstats) when given.
+    When disabled nothing is started and the dict stays empty.
+    """
+    summary = {}
+    if not enabled:
+        yield summary
+        return
+
+    profiler = cProfile.Profile()
+    tracemalloc.start()
+    start = time.perf_counter()
+    profiler.enable()
+    try:
+        yield summary
+    finally:
+        profiler.disable()
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        stats = pstats.Stats(profiler)
+        if output:
+            stats.dump_stats(output)
+
+        summary.update(elapsed_seconds=round(elapsed, 6),
+                       peak_memory_bytes=peak,
+                       top_functions=top_functions(stats, limit))
+        if output:
+            summary["stats_file"] = output
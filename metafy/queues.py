@@ -0,0 +1,142 @@
+import json
+import os
+import queue
+import threading
+import uuid
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+
+@dataclass
+class WorkItem:
+    body: Dict
+    receipt: Any = None
+
+
+class WorkQueue:
+    """
+    A queue of JSON serializable work items.
+
+    Items returned by get() must be passed to done() once they have been handled,
+    queues that support redelivery will hand unacknowledged items out again.
+    """
+    def put(self, body: Dict):
+        raise NotImplementedError
+
+    def get(self) -> Optional[WorkItem]:
+        "Return the next item or None if the queue is currently empty"
+        raise NotImplementedError
+
+    def done(self, item: WorkItem):
+        pass
+
+    def release(self, item: WorkItem):
+        "Hand an item that couldn't be handled back to the queue"
+        raise NotImplementedError
+
+
+class InMemoryQueue(WorkQueue):
+    "Thread safe queue for running every stage inside one process"
+    def __init__(self):
+        self.q = queue.Queue()
+
+    def put(self, body: Dict):
+        self.q.put(json.loads(json.dumps(body)))
+
+    def get(self) -> Optional[WorkItem]:
+        try:
+            return WorkItem(self.q.get_nowait())
+        except queue.Empty:
+            return None
+
+    def release(self, item: WorkItem):
+        self.q.put(item.body)
+
+
+class FileQueue(WorkQueue):
+    """
+    Queue stored as one JSON file per item in a directory.  Items are claimed by
+    renaming them, which is atomic, so several processes can share a directory.
+    """
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def put(self, body: Dict):
+        name = uuid.uuid4().hex
+        tmp = os.path.join(self.directory, f"{name}.tmp")
+        with open(tmp, "w") as f:
+            json.dump(body, f)
+        os.rename(tmp, os.path.join(self.directory, f"{name}.json"))
+
+    def get(self) -> Optional[WorkItem]:
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            claimed = f"{path}.claimed"
+            try:
+                os.rename(path, claimed)
+            except FileNotFoundError:
+                continue  # another worker claimed it first
+            with open(claimed) as f:
+                return WorkItem(json.load(f), claimed)
+        return None
+
+    def done(self, item: WorkItem):
+        os.remove(item.receipt)
+
+    def release(self, item: WorkItem):
+        os.rename(item.receipt, item.receipt[:-len(".claimed")])
+
+
+class SQSQueue(WorkQueue):
+    "Adapter for an Amazon SQS queue"
+    def __init__(self, queue_url: str, client=None, wait_seconds: int=1):
+        if client is None:
+            import boto3
+            client = boto3.client("sqs")
+        self.client = client
+        self.queue_url = queue_url
+        self.wait_seconds = wait_seconds
+
+    def put(self, body: Dict):
+        self.client.send_message(QueueUrl=self.queue_url, MessageBody=json.dumps(body))
+
+    def get(self) -> Optional[WorkItem]:
+        resp = self.client.receive_message(QueueUrl=self.queue_url,
+                                           MaxNumberOfMessages=1,
+                                           WaitTimeSeconds=self.wait_seconds)
+        messages = resp.get("Messages", [])
+        if not messages:
+            return None
+        return WorkItem(json.loads(messages[0]["Body"]), messages[0]["ReceiptHandle"])
+
+    def done(self, item: WorkItem):
+        self.client.delete_message(QueueUrl=self.queue_url, ReceiptHandle=item.receipt)
+
+    def release(self, item: WorkItem):
+        # make the message visible to other consumers straight away
+        self.client.change_message_visibility(QueueUrl=self.queue_url,
+                                              ReceiptHandle=item.receipt,
+                                              VisibilityTimeout=0)
+
+
+# in-process queues live as long as the process so every stage sees the same one
+_memory_queues = {}  # type: Dict[str, InMemoryQueue]
+_memory_lock = threading.Lock()
+
+
+def queue_from_url(url: str) -> WorkQueue:
+    """
+    Build a queue from a URL: memory://<name>, file://<directory> or an https://
+    SQS queue URL.  The same memory:// URL always returns the same queue.
+    """
+    if url.startswith("memory://"):
+        with _memory_lock:
+            return _memory_queues.setdefault(url, InMemoryQueue())
+    if url.startswith("file://"):
+        return FileQueue(url[len("file://"):])
+    if url.startswith("https://sqs."):
+        return SQSQueue(url)
+    raise ValueError(f"Unsupported queue URL: {url}")
@@ -0,0 +1,48 @@
+import copy
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import requests
+
+
+# Connection pools and parsed pages are kept at module level so they survive
+# between invocations of a warm Lambda container.
+_session = None  # type: Optional[requests.Session]
+_pages = {}  # type: Dict[str, Tuple[float, Any]]
+_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    "Return the shared requests Session, creating it on first use"
+    global _session
+    with _lock:
+        if _session is None:
+            _session = requests.Session()
+        return _session
+
+
+def cached_page(key: str, ttl: float, load: Callable[[], Any]) -> Any:
+    """
+    Return the value cached under key (usually a page URL) if it is younger than
+    ttl seconds, otherwise call load() and cache its result.  Callers get a copy
+    so they are free to modify it.
+    """
+    now = time.monotonic()
+    with _lock:
+        hit = _pages.get(key)
+    if hit is None or now - hit[0] > ttl:
+        hit = (now, load())
+        with _lock:
+            _pages[key] = hit
+    return copy.deepcopy(hit[1])
+
+
+def reset():
+    "Drop the shared session and every cached page"
+    global _session
+    with _lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+        _pages.clear()
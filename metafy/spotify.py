@@ -1,4 +1,4 @@
-import collections
+import collections.abc
 import json
 import os
 from base64 import b64encode as b64e
@@ -7,7 +7,9 @@ from typing import Optional, List, Dict
 from urllib.parse import quote_plus as qp
 
 import requests
-from fuzzywuzzy import fuzz
+
+from .matching import match_matrix
+from .session import get_session
 
 
 class SpotifyAlbum:
@@ -16,6 +18,10 @@ class SpotifyAlbum:
         self.title = title
         self.album_id = album_id
 
+    @property
+    def match_string(self) -> str:
+        return "{} {}".format(self.title, self.artist)
+
     def __eq__(self, other):
         return self.__dict__ == other.__dict__
 
@@ -31,13 +37,6 @@ class SpotifyAlbum:
                    title=album["name"],
                    album_id=album["uri"].split(":")[-1])  # strip spotify:album
 
-    def match(self, query: str):
-        """
-        Returns a percentage of confidence that an album matches a query string
-        """
-        artist_and_title = "{} {}".format(self.title, self.artist)
-        return fuzz.token_set_ratio(query, artist_and_title)
-
 
 class SpotifyTrack:
     def __init__(self, artist: str, title: str, track_id: str):
@@ -85,14 +84,14 @@ class SpotifyAuth(requests.auth.AuthBase):
         headers = {"Authorization": f"Basic {id_secret.decode('utf8')}"}
 
         # perform HTTP request using the refresh token and auth header
-        resp = requests.post(self.auth_url, data=data, headers=headers)
+        resp = get_session().post(self.auth_url, data=data, headers=headers)
         if resp.status_code != 200:
             raise Exception(f"Unable to refresh auth token: {resp.json()}")
 
         # get expiration date and token from the response JSON
         j = resp.json()
         self.token = j["access_token"]
-        self.expiration = dt.now() + td(int(j["expires_in"]))
+        self.expiration = dt.now() + td(seconds=int(j["expires_in"]))
 
     def __call__(self, req) -> requests.Request:
         if self.expiration - dt.now() < td(seconds=10):
@@ -102,65 +101,144 @@ class SpotifyAuth(requests.auth.AuthBase):
         return req
 
 
+class PlaylistMirror:
+    """
+    Local copy of a playlist's tracks tagged with the snapshot_id they belong to.
+
+    When a path is given the mirror is persisted as JSON so later runs can skip
+    reading the playlist if its snapshot_id hasn't changed.
+    """
+    def __init__(self, path: Optional[str]=None):
+        self.path = path
+        self.snapshot_id = None
+        self.tracks = []
+        self.load()
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                j = json.load(f)
+            self.snapshot_id = j["snapshot_id"]
+            self.tracks = [SpotifyTrack(**t) for t in j["tracks"]]
+        except (ValueError, KeyError, TypeError):
+            # a corrupt mirror is just a cache miss
+            self.snapshot_id, self.tracks = None, []
+
+    def save(self):
+        if not self.path:
+            return
+        with open(self.path, "w") as f:
+            json.dump({"snapshot_id": self.snapshot_id,
+                       "tracks": [t.__dict__ for t in self.tracks]}, f)
+
+    def update(self, snapshot_id: Optional[str], tracks: List[SpotifyTrack]):
+        self.snapshot_id = snapshot_id
+        self.tracks = list(tracks)
+        self.save()
+
+    def apply(self, snapshot_id: Optional[str], added=(), removed=()):
+        """
+        Replay a write on the mirror.  Unless the mirror was in sync before the
+        write its contents are unknown, so it is invalidated instead.
+        """
+        if self.snapshot_id is None:
+            return self.update(None, [])
+
+        removed = {t.track_id for t in removed}
+        self.update(snapshot_id,
+                    [t for t in self.tracks if t.track_id not in removed] + list(added))
+
+
 class Spotify:
     urlbase = "https://api.spotify.com/v1/"
+    search_limit = 5
 
     def __init__(self,
-                 playlist_id: str="65RYrUbKJgX0eJHBIZ14Fe"):
+                 playlist_id: str="65RYrUbKJgX0eJHBIZ14Fe",
+                 mirror_path: Optional[str]=None):
         self.auth = SpotifyAuth(
             os.environ["SPOTIFY_CLIENT_ID"],
             os.environ["SPOTIFY_CLIENT_SECRET"],
             os.environ["SPOTIFY_REF_TK"]
         )
         self.playlist_id = playlist_id
+        self.mirror = PlaylistMirror(mirror_path)
 
     def clear_playlist(self) -> List[SpotifyTrack]:
         """
         Removes all tracks from the playlist
         """
         tracks = self.get_tracks_from_playlist()
-        self.delete_tracks_from_playlist(tracks)
+        if tracks:
+            self.delete_tracks_from_playlist(tracks)
 
         return tracks
 
+    def get_playlist_snapshot_id(self) -> Optional[str]:
+        """
+        Returns the playlist's current snapshot_id without reading its tracks
+        """
+        url = "{}playlists/{}?fields=snapshot_id".format(self.urlbase, self.playlist_id)
+
+        resp = get_session().get(url, auth=self.auth)
+        if resp.status_code != 200:
+            raise Exception("Unable to get playlist snapshot from Spotify API: {}".format(resp.json()))
+
+        return resp.json().get("snapshot_id")
+
     def get_tracks_from_playlist(self) -> List[SpotifyTrack]:
         """
-        Returns a list of SpotifyTrack objects for the specified playlist
+        Returns a list of SpotifyTrack objects for the specified playlist.
+
+        The local mirror is returned instead of reading the playlist when its
+        snapshot_id still matches the playlist's
         """
+        snapshot_id = self.get_playlist_snapshot_id()
+        if snapshot_id is not None and snapshot_id == self.mirror.snapshot_id:
+            return list(self.mirror.tracks)
+
         url = "{}playlists/{}/tracks".format(
             self.urlbase, self.playlist_id)
         query = "?fields=items(track(name, id, artists(name)))"
 
-        resp = requests.get(url+query, auth=self.auth)
+        resp = get_session().get(url+query, auth=self.auth)
         if resp.status_code != 200:
             raise Exception("Unable to get playlist tracks from Spotify API: {}".format(resp.json()))
 
         items = resp.json().get("items")
+        tracks = [SpotifyTrack.from_track_json(track.get("track")) for track in items]
+        self.mirror.update(snapshot_id, tracks)
 
-        return [SpotifyTrack.from_track_json(track.get("track")) for track in items]
+        return tracks
 
     def add_tracks_to_playlist(self, tracks: List[SpotifyTrack]):
         """
         Adds the given SpotifyTracks to the playlist_id
         """
-        if not isinstance(tracks, collections.Iterable):
+        if not isinstance(tracks, collections.abc.Iterable):
             tracks = [tracks]
+        tracks = list(tracks)
 
         data = {"uris": [track.to_uri() for track in tracks]}
         url = "{}playlists/{}/tracks".format(self.urlbase,
                                              self.playlist_id)
 
         # POST http request to API and ensure it returns 201
-        resp = requests.post(url, auth=self.auth, data=json.dumps(data))
+        resp = get_session().post(url, auth=self.auth, data=json.dumps(data))
         if resp.status_code != 201:
             raise Exception("Unable to add tracks to the playlist: {}".format(resp.json()))
 
+        self.mirror.apply(resp.json().get("snapshot_id"), added=tracks)
+
     def delete_tracks_from_playlist(self, tracks: List[SpotifyTrack]):
         """
         Removes the given SpotifyTracks from the playlist_id
         """
-        if not isinstance(tracks, collections.Iterable):
+        if not isinstance(tracks, collections.abc.Iterable):
             tracks = [tracks]
+        tracks = list(tracks)
 
         # convert uris into a json object
         data = {"tracks": [{"uri": track.to_uri()} for track in tracks]}
@@ -168,10 +246,12 @@ class Spotify:
                                              self.playlist_id)
 
         # DELETE http request to delete the tracks and ensure 200 was returned
-        resp = requests.delete(url, auth=self.auth, data=json.dumps(data))
+        resp = get_session().delete(url, auth=self.auth, data=json.dumps(data))
         if resp.status_code != 200:
             raise Exception("Unable to delete tracks")
 
+        self.mirror.apply(resp.json().get("snapshot_id"), removed=tracks)
+
     def update_playlist_description(self, description: str):
         """
         Update the text description diplayed on the page when viewing a
@@ -183,27 +263,61 @@ class Spotify:
         data = json.dumps({"description": description})
 
         # PUT http request to update description of playlist
-        resp = requests.put(url, auth=self.auth, headers=header, data=data)
+        resp = get_session().put(url, auth=self.auth, headers=header, data=data)
         if resp.status_code != 200:
             raise Exception("Unable to update playlist description: {}".format(resp.json()))
 
-    def search_for_album(self, album_query_string: str) -> Optional[SpotifyAlbum]:
+        # the details endpoint doesn't return the new snapshot_id so ask for it.
+        # metafy is the playlist's only writer so the snapshot read now is ours
+        if self.mirror.snapshot_id is not None:
+            self.mirror.update(self.get_playlist_snapshot_id(), self.mirror.tracks)
+
+    def search_for_album(self, title: str, artist: Optional[str]=None) -> Optional[SpotifyAlbum]:
         """
-        Search for an album by album title and return first result
+        Search for an album by title (and optionally artist) and return the best result.
+
+        Queries are tried from most to least precise and a looser query is only
+        sent when the stricter one didn't produce an acceptable match.
         """
-        q = "q=album:{}&type=album".format(qp(album_query_string))
+        match_string = title if artist is None else "{} {}".format(title, artist)
+        # looser queries tend to return the same candidates, only check each one once
+        rejected = set()
+
+        for query in self._album_search_queries(title, artist):
+            albums = self._search_albums(query)
+            if albums:
+                best = self._get_best_album(match_string, albums, rejected)
+                if best:
+                    return best
+        return None
+
+    def _album_search_queries(self, title: str, artist: Optional[str]=None) -> List[str]:
+        """
+        Return search query strings ordered from the most to the least precise
+        """
+        if artist is None:
+            return ["album:{}".format(title)]
+
+        # a quote inside a value would end the quoted filter early
+        quoted_title, quoted_artist = title.replace('"', ""), artist.replace('"', "")
+        return ['album:"{}" artist:"{}"'.format(quoted_title, quoted_artist),
+                "album:{} artist:{}".format(title, artist),
+                "{} {}".format(title, artist)]
+
+    def _search_albums(self, query: str) -> List[SpotifyAlbum]:
+        """
+        Send a single album search request and return its results as SpotifyAlbums
+        """
+        q = "q={}&type=album&limit={}".format(qp(query), self.search_limit)
         url = "{}search?{}".format(self.urlbase, q)
 
-        resp = requests.get(url, auth=self.auth)
+        resp = get_session().get(url, auth=self.auth)
         if resp.status_code != 200:
             raise Exception("Search request to API failed{}".format(resp.json()))
 
         # create an album based on the json results
-        albums = [SpotifyAlbum.from_album_json(album)
-                  for album in resp.json()["albums"]["items"]]
-        if albums:
-            # return the highest ranked album
-            return self._get_best_album(album_query_string, albums)
+        return [SpotifyAlbum.from_album_json(album)
+                for album in resp.json()["albums"]["items"]]
 
     def get_tracks_from_album(self, album: SpotifyAlbum) -> List[SpotifyTrack]:
         """
@@ -211,7 +325,7 @@ class Spotify:
         """
         url = "{}albums/{}/tracks".format(self.urlbase, album.album_id)
 
-        resp = requests.get(url, auth=self.auth)
+        resp = get_session().get(url, auth=self.auth)
         if resp.status_code != 200:
             raise Exception("API Failed to retrieve tracks for album: {}".format(resp.json()))
 
@@ -219,21 +333,29 @@ class Spotify:
 
         return [SpotifyTrack.from_track_json(track) for track in items]
 
-    def _get_best_album(self, match_string: str, albums: SpotifyAlbum) -> Optional[SpotifyAlbum]:
+    def _get_best_album(self,
+                        match_string: str,
+                        albums: List[SpotifyAlbum],
+                        rejected: Optional[set]=None) -> Optional[SpotifyAlbum]:
         """
         Find a matching album given a list of search results from Spotify.
 
         The album should not be a single and should also fuzzy match the artist
-        and title  within a certain threshold
-        """
-        # filter out single albums or albums that match with less than 90% confidence
-        matches = [dict(album=a, match=a.match(match_string)) for a in albums
-                   if len(self.get_tracks_from_album(a)) > 1 and
-                   a.match(match_string) > 90]
-
-        if matches:
-            # return the highest matched album
-            topresult = sorted(matches, key=lambda x: x["match"], reverse=True)[0]
-            return topresult["album"]
-        else:
-            return None
+        and title  within a certain threshold.  Album ids in `rejected` are skipped
+        and singles found here are added to it.
+        """
+        rejected = set() if rejected is None else rejected
+        # score every album in one batch and rank them by confidence, best first
+        scores = match_matrix([match_string], [a.match_string for a in albums])[0]
+        matches = sorted(zip(scores, albums), key=lambda x: x[0], reverse=True)
+
+        # only fetch tracks for confident matches and stop at the first non-single
+        for match, album in matches:
+            if match <= 90:
+                break
+            if album.album_id in rejected:
+                continue
+            if len(self.get_tracks_from_album(album)) > 1:
+                return album
+            rejected.add(album.album_id)
+        return None
@@ -9,11 +9,21 @@ from metafy.metacritic import MetacriticSource, DetailedMetacriticSource
 from metafy.pitchfork import PitchforkSource
 from metafy.scraper import Scraper
 from metafy.spotify import SpotifyAuth, Spotify
+from metafy.metacritic import acquire_user_agent
+from metafy import session
 
 
 RESOURCES = os.path.join(os.path.dirname(__file__), "resources")
 
 
+@pytest.fixture(autouse=True)
+def ColdContainer():
+    # pages, sessions and user agents are cached at module level between runs
+    session.reset()
+    acquire_user_agent.cache_clear()
+    yield
+
+
 # Spotify fixtures
 @pytest.fixture
 def RequestsMockedSpotifyAPI():
@@ -21,6 +31,15 @@ def RequestsMockedSpotifyAPI():
         rm.register_uri("GET",
                         re.compile("https://api.spotify.com/v1/playlists/.*"),
                         json=json.load(open(os.path.join(RESOURCES, "tracks.json"))))
+        rm.register_uri("GET",
+                        re.compile(r"https://api.spotify.com/v1/playlists/[^/]*\?fields=snapshot_id"),
+                        json={"snapshot_id": "snapshot-1"})
+        rm.register_uri("POST",
+                        re.compile("https://api.spotify.com/v1/playlists/.*/tracks"),
+                        json={"snapshot_id": "snapshot-2"}, status_code=201)
+        rm.register_uri("DELETE",
+                        re.compile("https://api.spotify.com/v1/playlists/.*/tracks"),
+                        json={"snapshot_id": "snapshot-3"})
         rm.register_uri("GET",
                         re.compile("https://api.spotify.com/v1/albums.*"),
                         json=json.load(open(os.path.join(RESOURCES, "albums.json"))))
@@ -122,4 +141,6 @@ def PitchforkReq():
     with requests_mock.Mocker() as rm:
         with open(os.path.join(RESOURCES, "pitchfork.html")) as f:
             rm.register_uri("GET", PitchforkSource.URL, text=f.read())
+        with open(os.path.join(RESOURCES, "pitchfork_review.html")) as f:
+            rm.register_uri("GET", re.compile("https://pitchfork.com/reviews/albums/.*"), text=f.read())
         yield rm
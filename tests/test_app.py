@@ -1,5 +1,6 @@
-from metafy.app import remove_duplicates
+from metafy.app import remove_duplicates, lambda_handler, prepare_container, reset_container, make_spotify
 from metafy.albums import Album
+from metafy.session import cached_page, get_session
 
 
 def test_remove_duplicates():
@@ -15,3 +16,42 @@ def test_remove_duplicates():
     filtered_albums = remove_duplicates(albums)
     albums.pop(1)
     assert albums == filtered_albums
+
+
+def test_container_is_warm_until_configuration_changes():
+    env = {"ENVIRONMENT_TYPE": "test", "SPOTIFY_PLAYLIST_ID": "playlist"}
+    reset_container()
+
+    assert prepare_container(env) == "cold"
+    api = make_spotify(env)
+    assert prepare_container(env) == "warm"
+    assert make_spotify(env) is api
+
+    env["SPOTIFY_PLAYLIST_ID"] = "another playlist"
+    assert prepare_container(env) == "cold"
+    assert make_spotify(env) is not api
+
+
+def test_handler_reports_cold_then_warm_invocations(monkeypatch):
+    monkeypatch.setattr("metafy.app.scrape", lambda env: [])
+    monkeypatch.setenv("ENVIRONMENT_TYPE", "test")
+    reset_container()
+
+    assert lambda_handler({}, None)["invocation"] == "cold"
+    assert lambda_handler({}, None)["invocation"] == "warm"
+
+
+def test_cached_pages_are_loaded_once_and_copied():
+    loads = []
+
+    def load():
+        loads.append(1)
+        return [{"title": "Led Zeppelin I"}]
+
+    first = cached_page("https://example.com", 60, load)
+    first[0]["title"] = "changed"
+    second = cached_page("https://example.com", 60, load)
+
+    assert len(loads) == 1
+    assert second == [{"title": "Led Zeppelin I"}]
+    assert get_session() is get_session()
@@ -0,0 +1,65 @@
+import os
+import json
+import pstats
+import shutil
+from click.testing import CliRunner
+
+from metafy.cli import cli, parse_snapshot_name, find_snapshots
+
+
+RESOURCES = os.path.join(os.path.dirname(__file__), "resources")
+
+
+def make_snapshots(directory):
+    for name, resource in (("metacritic-2017-04-30.html", "metacritic_sample.html"),
+                           ("metacritic_detailed-2020-04-03.html", "metacritic_sample_detailed.html"),
+                           ("pitchfork-2020-04-03.html", "pitchfork.html"),
+                           ("notes.txt", "pitchfork.html")):
+        shutil.copy(os.path.join(RESOURCES, resource), os.path.join(directory, name))
+
+
+def test_snapshot_names_are_parsed_and_sorted_by_date(tmp_path):
+    make_snapshots(str(tmp_path))
+
+    assert parse_snapshot_name("notes.txt") is None
+    assert [os.path.basename(p) for p in find_snapshots(str(tmp_path))] == [
+        "metacritic-2017-04-30.html",
+        "metacritic_detailed-2020-04-03.html",
+        "pitchfork-2020-04-03.html",
+    ]
+
+
+def test_backfill_streams_deduplicated_albums_as_json_lines(tmp_path):
+    make_snapshots(str(tmp_path))
+
+    result = CliRunner().invoke(cli, ["backfill", str(tmp_path), "--workers", "2"])
+    assert result.exit_code == 0
+
+    albums = [json.loads(line) for line in result.output.splitlines()]
+    # 9 metacritic, 15 detailed metacritic and 6 pitchfork albums fall in their windows
+    # and one of them is on both the detailed metacritic and pitchfork pages
+    assert len(albums) == 9 + 15 + 6 - 1
+    assert len({(a["title"], a["artist"]) for a in albums}) == len(albums)
+    assert albums[0]["source"] == "Metacritic Source"
+    assert {a["date"] for a in albums if a["source"] == "Pitchfork Source"} == {"Apr 03 2020"}
+
+
+def test_backfill_profiles_the_parsing_in_process(tmp_path):
+    snapshots = tmp_path / "snapshots"
+    snapshots.mkdir()
+    make_snapshots(str(snapshots))
+    stats_file = str(tmp_path / "backfill.prof")
+
+    result = CliRunner().invoke(cli, ["backfill", str(snapshots), "--workers", "4",
+                                      "--profile", stats_file, "-o", str(tmp_path / "albums.jsonl")])
+    assert result.exit_code == 0
+
+    profiled = {name for _, _, name in pstats.Stats(stats_file).stats}
+    assert "parse_snapshot" in profiled
+    assert "parse" in profiled
+
+
+def test_backfill_fails_without_snapshots(tmp_path):
+    result = CliRunner().invoke(cli, ["backfill", str(tmp_path)])
+    assert result.exit_code != 0
+    assert "No snapshots found" in result.output
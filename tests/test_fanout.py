@@ -0,0 +1,194 @@
+import pytest
+from metafy.albums import Album
+from metafy.app import lambda_handler
+from metafy.fanout import enqueue_albums, resolve_albums, resolve_in_parallel, aggregate
+from metafy.queues import InMemoryQueue, FileQueue, SQSQueue, WorkItem, queue_from_url
+from metafy.spotify import SpotifyAlbum, SpotifyTrack
+
+
+class FakeSpotify:
+    def __init__(self):
+        self.writes = []
+        self.description = None
+
+    def clear_playlist(self):
+        self.writes.clear()
+
+    def search_for_album(self, title, artist=None):
+        if title == "Missing":
+            return None
+        return SpotifyAlbum(artist, title, f"id-{title}")
+
+    def get_tracks_from_album(self, album):
+        return [SpotifyTrack(album.artist, f"{album.title} {i}", f"{album.album_id}-{i}") for i in range(2)]
+
+    def add_tracks_to_playlist(self, tracks):
+        self.writes.append(tracks)
+
+    def update_playlist_description(self, description):
+        self.description = description
+
+
+def make_albums(titles):
+    return [Album(title=t, artist="Artist", source="Source", img="", rating=90, date="Jan 01 2020")
+            for t in titles]
+
+
+def run_pipeline(work, results):
+    api = FakeSpotify()
+    titles = [f"Album {i}" for i in range(20)] + ["Missing"]
+
+    assert enqueue_albums(make_albums(titles), work, "run") == 21
+    assert resolve_in_parallel(api, work, results, workers=4) == 21
+    assert work.get() is None
+    assert aggregate(api, results, "description", "run", 21) == 40
+    return api
+
+
+def test_fanout_with_in_memory_queues_writes_tracks_in_scraped_order():
+    api = run_pipeline(InMemoryQueue(), InMemoryQueue())
+
+    # 40 tracks fit into a single write
+    assert len(api.writes) == 1
+    assert [t.track_id for t in api.writes[0]][:4] == ["id-Album 0-0", "id-Album 0-1", "id-Album 1-0", "id-Album 1-1"]
+    assert api.description == "description"
+
+
+def test_fanout_with_file_queues(tmp_path):
+    work = queue_from_url(f"file://{tmp_path / 'work'}")
+    results = queue_from_url(f"file://{tmp_path / 'results'}")
+    run_pipeline(work, results)
+
+    # acknowledged items are removed from disk
+    assert list((tmp_path / "work").iterdir()) == []
+    assert list((tmp_path / "results").iterdir()) == []
+
+
+def test_results_are_kept_when_the_playlist_write_fails(tmp_path):
+    class FailingSpotify(FakeSpotify):
+        def add_tracks_to_playlist(self, tracks):
+            raise Exception("Unable to add tracks to the playlist")
+
+    work, results = FileQueue(str(tmp_path / "work")), FileQueue(str(tmp_path / "results"))
+    enqueue_albums(make_albums(["Album 0", "Album 1"]), work, "run")
+    resolve_in_parallel(FakeSpotify(), work, results, workers=2)
+
+    with pytest.raises(Exception):
+        aggregate(FailingSpotify(), results, "description", "run", 2)
+
+    # every result is still on the queue for the next attempt
+    assert aggregate(FakeSpotify(), results, "description", "run", 2) == 4
+
+
+def test_work_items_are_released_when_resolving_fails(tmp_path):
+    class FlakySpotify(FakeSpotify):
+        failed = False
+
+        def search_for_album(self, title, artist=None):
+            if not self.failed:
+                self.failed = True
+                raise Exception("Spotify is unavailable")
+            return super().search_for_album(title, artist)
+
+    work, results = FileQueue(str(tmp_path / "work")), FileQueue(str(tmp_path / "results"))
+    enqueue_albums(make_albums(["Album 0", "Album 1"]), work, "run")
+
+    with pytest.raises(Exception):
+        resolve_albums(FlakySpotify(), work, results)
+
+    # the failed item went straight back to the queue instead of staying claimed
+    assert not list((tmp_path / "work").glob("*.claimed"))
+    assert resolve_albums(FakeSpotify(), work, results) == 2
+    assert aggregate(FakeSpotify(), results, "description", "run", 2) == 4
+
+
+def test_aggregate_waits_until_every_result_of_the_run_is_ready():
+    api, work, results = FakeSpotify(), InMemoryQueue(), InMemoryQueue()
+    enqueue_albums(make_albums(["Album 0", "Album 1"]), work, "run")
+
+    # only the first album has been resolved so far
+    partial = InMemoryQueue()
+    partial.put(work.get().body)
+    resolve_in_parallel(api, partial, results, workers=1)
+
+    with pytest.raises(Exception, match="Only 1 of 2 results"):
+        aggregate(api, results, "description", "run", 2)
+    assert api.writes == [] and api.description is None
+
+    resolve_in_parallel(api, work, results, workers=1)
+    assert aggregate(api, results, "description", "run", 2) == 4
+
+
+def test_aggregate_ignores_results_from_other_runs():
+    api, work, results = FakeSpotify(), InMemoryQueue(), InMemoryQueue()
+    enqueue_albums(make_albums(["Stale"]), work, "aborted run")
+    enqueue_albums(make_albums(["Album 0", "Album 1"]), work, "run")
+    resolve_in_parallel(api, work, results, workers=2)
+
+    assert aggregate(api, results, "description", "run", 2) == 4
+    assert [t.track_id for t in api.writes[0]] == ["id-Album 0-0", "id-Album 0-1", "id-Album 1-0", "id-Album 1-1"]
+    assert results.get() is None
+
+
+def test_memory_queues_are_shared_by_url():
+    queue_from_url("memory://shared").put({"n": 1})
+
+    assert queue_from_url("memory://shared").get().body == {"n": 1}
+    assert queue_from_url("memory://other") is not queue_from_url("memory://shared")
+
+
+def test_split_mode_handler_runs_locally_with_memory_queues(monkeypatch):
+    api = FakeSpotify()
+    monkeypatch.setattr("metafy.app.scrape", lambda env: make_albums(["Album 0", "Album 1"]))
+    monkeypatch.setattr("metafy.app.make_spotify", lambda env: api)
+    monkeypatch.setenv("METAFY_WORK_QUEUE", "memory://handler-work")
+    monkeypatch.setenv("METAFY_RESULT_QUEUE", "memory://handler-results")
+
+    enqueued = lambda_handler({"mode": "enqueue"}, None)
+    assert enqueued["expected"] == 2
+    assert lambda_handler({"mode": "resolve"}, None)["resolved"] == 2
+
+    event = {"mode": "aggregate", "run_id": enqueued["run_id"], "expected": enqueued["expected"]}
+    assert lambda_handler(event, None)["tracks"] == 4
+    assert len(api.writes) == 1
+
+
+def test_file_queue_items_are_claimed_once(tmp_path):
+    a, b = FileQueue(str(tmp_path)), FileQueue(str(tmp_path))
+    a.put({"n": 1})
+
+    item = b.get()
+    assert item.body == {"n": 1}
+    assert a.get() is None
+
+
+def test_sqs_queue_sends_receives_and_deletes_messages():
+    class FakeSQS:
+        def __init__(self):
+            self.calls = []
+
+        def send_message(self, **kwargs):
+            self.calls.append(("send", kwargs))
+
+        def receive_message(self, **kwargs):
+            return {"Messages": [{"Body": '{"n": 1}', "ReceiptHandle": "handle"}]}
+
+        def delete_message(self, **kwargs):
+            self.calls.append(("delete", kwargs))
+
+        def change_message_visibility(self, **kwargs):
+            self.calls.append(("release", kwargs))
+
+    client = FakeSQS()
+    q = SQSQueue("https://sqs.example/queue", client=client)
+    q.put({"n": 1})
+    item = q.get()
+    q.release(item)
+    q.done(item)
+
+    assert item == WorkItem({"n": 1}, "handle")
+    assert client.calls == [
+        ("send", {"QueueUrl": "https://sqs.example/queue", "MessageBody": '{"n": 1}'}),
+        ("release", {"QueueUrl": "https://sqs.example/queue", "ReceiptHandle": "handle", "VisibilityTimeout": 0}),
+        ("delete", {"QueueUrl": "https://sqs.example/queue", "ReceiptHandle": "handle"}),
+    ]
@@ -0,0 +1,58 @@
+from metafy.albums import Album
+from metafy.history import History
+
+
+def make_album(title="Led Zeppelin I", artist="Led Zeppelin", rating=90, date="Jan 12 1969"):
+    return Album(artist=artist, title=title, rating=rating, img="", date=date, source="Source 1")
+
+
+def test_unseen_album_is_changed():
+    h = History()
+    assert h.get(make_album()) is None
+    assert h.changed(make_album())
+
+
+def test_recorded_album_is_unchanged_until_rating_changes():
+    h = History()
+    h.record(make_album(), "spotify-id", week="2020-W01")
+
+    assert not h.changed(make_album())
+    # normalized artist/title keys ignore case and punctuation
+    assert not h.changed(make_album(title="led zeppelin I!", artist="LED ZEPPELIN"))
+    assert h.changed(make_album(rating=95))
+    assert h.get(make_album()).spotify_id == "spotify-id"
+
+
+def test_added_in_week_only_returns_resolved_albums():
+    h = History()
+    h.record(make_album(title="Led Zeppelin I"), "id-1", week="2020-W01")
+    h.record(make_album(title="Led Zeppelin II"), None, week="2020-W01")
+    h.record(make_album(title="Led Zeppelin III"), "id-3", week="2020-W02")
+
+    added = h.added_in_week("2020-W01")
+    assert [(r.title, r.spotify_id) for r in added] == [("Led Zeppelin I", "id-1")]
+
+
+def test_albums_missing_from_spotify_are_searched_again():
+    h = History()
+    h.record(make_album(), None, week="2020-W01")
+
+    assert h.changed(make_album())
+
+
+def test_albums_keep_the_week_they_were_added_in():
+    h = History()
+    h.record(make_album(), "id-1", week="2020-W01")
+    h.record(make_album(rating=95), "id-1", week="2020-W02")
+
+    assert [r.rating for r in h.added_in_week("2020-W01")] == [95]
+    assert h.added_in_week("2020-W02") == []
+
+
+def test_albums_found_later_are_added_in_the_week_they_were_found():
+    h = History()
+    h.record(make_album(), None, week="2020-W01")
+    h.record(make_album(), "id-1", week="2020-W02")
+
+    assert h.added_in_week("2020-W01") == []
+    assert [r.spotify_id for r in h.added_in_week("2020-W02")] == ["id-1"]
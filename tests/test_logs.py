@@ -0,0 +1,85 @@
+import sys
+import logging
+import queue
+import subprocess
+
+from metafy.logs import SampleFilter, DeferredQueueHandler
+
+
+class Loud:
+    "Object whose repr records that it was formatted"
+    formatted = 0
+
+    def __repr__(self):
+        Loud.formatted += 1
+        return "Loud()"
+
+
+def album_record(msg, key=None):
+    record = logging.LogRecord("metafy.albums", logging.DEBUG, __file__, 1, msg, (), None)
+    if key is not None:
+        record.album_key = key
+    return record
+
+
+def test_sample_filter_keeps_or_drops_every_record_of_an_album_together():
+    f = SampleFilter(3)
+    albums = [f"Album {i}:Artist" for i in range(60)]
+    steps = ("Processing", "Searching", "Found")
+
+    kept = {a for a in albums if f.filter(album_record("Processing", a))}
+    for a in albums:
+        assert [f.filter(album_record(step, a)) for step in steps] == [a in kept] * 3
+
+    # roughly a third of the albums are kept
+    assert 5 < len(kept) < 40
+    assert f.filter(album_record("no album"))
+
+
+def test_disabled_records_are_never_formatted():
+    log = logging.getLogger("metafy.test.disabled")
+    log.setLevel(logging.INFO)
+    log.addHandler(DeferredQueueHandler(queue.Queue()))
+    log.propagate = False
+
+    Loud.formatted = 0
+    log.debug("album: %r", Loud())
+    assert Loud.formatted == 0
+
+
+def test_queued_records_are_formatted_by_the_consumer():
+    q = queue.Queue()
+    log = logging.getLogger("metafy.test.deferred")
+    log.setLevel(logging.INFO)
+    log.addHandler(DeferredQueueHandler(q))
+    log.propagate = False
+
+    Loud.formatted = 0
+    log.info("album: %r", Loud())
+    assert Loud.formatted == 0
+
+    record = q.get_nowait()
+    assert record.getMessage() == "album: Loud()"
+    assert Loud.formatted == 1
+
+
+def run_python(code):
+    return subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+
+
+def test_importing_metafy_leaves_logging_alone():
+    out = run_python("import logging, metafy.app, metafy.cli\n"
+                     "log = logging.getLogger('metafy')\n"
+                     "print(log.propagate, len(log.handlers))")
+    assert out.stdout.split() == ["True", "0"]
+
+
+def test_worker_processes_write_their_own_records():
+    out = run_python("import logging\n"
+                     "from concurrent.futures import ProcessPoolExecutor\n"
+                     "from metafy.logs import configure_logging, configure_worker_logging, flush_logging\n"
+                     "configure_logging('INFO')\n"
+                     "with ProcessPoolExecutor(1, initializer=configure_worker_logging, initargs=('INFO', 1)) as pool:\n"
+                     "    pool.submit(logging.getLogger('metafy').warning, 'from a worker').result()\n"
+                     "flush_logging()")
+    assert "from a worker" in out.stderr
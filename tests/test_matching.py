@@ -0,0 +1,33 @@
+from fuzzywuzzy import fuzz
+
+from metafy.matching import match_matrix
+
+
+def test_match_matrix_agrees_with_per_pair_scores():
+    queries = ["Whenever You Need Somebody Rick Astley", "together at last jeff tweedy"]
+    candidates = ["Whenever You Need Somebody Rick Astley",
+                  "Platinum & Gold Collection Rick Astley",
+                  "Together At Last (Deluxe) Jeff Tweedy"]
+
+    scores = match_matrix(queries, candidates)
+
+    assert scores.shape == (2, 3)
+    assert scores.tolist() == [[fuzz.token_set_ratio(q, c) for c in candidates] for q in queries]
+
+
+def test_match_matrix_strips_non_ascii_like_fuzzywuzzy():
+    # these pairs sit on either side of the > 90 cutoff unless Latin-1 characters are dropped
+    pairs = [("Sigur R\u00f3s ()", "Sigur Ros ()"),
+             ("\u00c1g\u00e6tis byrjun Sigur R\u00f3s", "Agaetis Byrjun Sigur Ros"),
+             ("Bj\u00f6rk Homogenic", "Bjork Homogenic"),
+             ("\u5742\u672c\u9f8d\u4e00 async", "\u5742\u672c async")]
+
+    for query, candidate in pairs:
+        assert match_matrix([query], [candidate])[0][0] == fuzz.token_set_ratio(query, candidate)
+
+    assert match_matrix(["Sigur R\u00f3s ()"], ["Sigur Ros ()"])[0][0] == 94
+
+
+def test_match_matrix_handles_empty_inputs():
+    assert match_matrix([], ["a"]).shape == (0, 1)
+    assert match_matrix(["a"], []).shape == (1, 0)
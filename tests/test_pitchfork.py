@@ -1,9 +1,59 @@
+import re
+from freezegun import freeze_time
+
 from metafy.pitchfork import PitchforkSource
 
 
+def review_requests(rm):
+    return [r for r in rm.request_history if "/reviews/albums/" in r.url]
+
+
+@freeze_time("2020-04-01")
 def test_pitchfork_source_supplies_6_albums(PitchforkReq):
     p = PitchforkSource()
     albums = p.gen_albums()
 
     num_albums = 6
     assert len(list(albums)) == num_albums
+
+
+@freeze_time("2020-04-01")
+def test_pitchfork_albums_get_rating_and_date_from_their_review(PitchforkReq):
+    albums = list(PitchforkSource().gen_albums())
+
+    assert {a.rating for a in albums} == {85}
+    assert {a.date for a in albums} == {"Mar 27 2020"}
+
+
+@freeze_time("2020-04-10")
+def test_pitchfork_albums_outside_the_window_are_filtered(PitchforkReq):
+    assert list(PitchforkSource().gen_albums()) == []
+
+
+@freeze_time("2020-04-01")
+def test_pitchfork_low_rated_reviews_are_filtered(PitchforkReq):
+    PitchforkReq.register_uri("GET", "https://pitchfork.com/reviews/albums/waxahatchee-saint-cloud/",
+                              text='<span class="score">7.0</span><time datetime="2020-03-27T05:00:00"></time>')
+
+    titles = [a.title for a in PitchforkSource().gen_albums()]
+    assert len(titles) == 5
+    assert "Saint Cloud" not in titles
+
+
+@freeze_time("2020-04-01")
+def test_pitchfork_reviews_are_cached_by_url_across_runs(PitchforkReq, tmp_path):
+    path = str(tmp_path / "reviews.json")
+    list(PitchforkSource(review_cache_path=path).gen_albums())
+    assert len(review_requests(PitchforkReq)) == 6
+
+    albums = list(PitchforkSource(review_cache_path=path).gen_albums())
+    assert len(albums) == 6
+    assert len(review_requests(PitchforkReq)) == 6
+
+
+@freeze_time("2020-04-01")
+def test_pitchfork_unreadable_reviews_are_dropped(PitchforkReq):
+    PitchforkReq.register_uri("GET", re.compile("https://pitchfork.com/reviews/albums/.*"), text="<html></html>")
+
+    # the listing's placeholder rating and date would otherwise pass the filter
+    assert list(PitchforkSource().gen_albums()) == []
@@ -0,0 +1,32 @@
+import pstats
+
+from metafy.profiling import profiled, profiling_requested
+
+
+def work():
+    return sorted(str(i) for i in range(10000))
+
+
+def test_profiling_requested_by_event_or_environment():
+    assert profiling_requested({"profile": True}, {})
+    assert profiling_requested({}, {"METAFY_PROFILE": "true"})
+    assert not profiling_requested({}, {"METAFY_PROFILE": "0"})
+    assert not profiling_requested(None, {})
+
+
+def test_disabled_profiling_leaves_summary_empty():
+    with profiled(False) as summary:
+        work()
+    assert summary == {}
+
+
+def test_enabled_profiling_summarizes_and_writes_stats(tmp_path):
+    output = str(tmp_path / "metafy.prof")
+    with profiled(True, output) as summary:
+        work()
+
+    assert summary["peak_memory_bytes"] > 0
+    assert summary["elapsed_seconds"] > 0
+    assert any("work" in f["function"] for f in summary["top_functions"])
+    assert summary["stats_file"] == output
+    assert pstats.Stats(output).total_calls > 0
@@ -1,9 +1,14 @@
+import re
+import json
 import requests
 import os
 import datetime
 from metafy.spotify import SpotifyAuth, Spotify, SpotifyTrack, SpotifyAlbum
 
 
+RESOURCES = os.path.join(os.path.dirname(__file__), "resources")
+
+
 def test_spotify_get_tracks_playlist(MockedSpotifyAPI):
     spotify = MockedSpotifyAPI
     tracks = spotify.get_tracks_from_playlist()
@@ -22,3 +27,122 @@ def test_spotify_search_returns_correct_albums(MockedSpotifyAPI):
     expected = SpotifyAlbum("Rick Astley", "Whenever You Need Somebody", "6XhjNHCyCDyyGJRM5mg40G")
 
     assert album == expected
+
+
+def test_spotify_search_uses_field_filters_and_limit(MockedSpotifyAPI, RequestsMockedSpotifyAPI):
+    spotify = MockedSpotifyAPI
+    album = spotify.search_for_album("Whenever You Need Somebody", "Rick Astley")
+
+    assert album == SpotifyAlbum("Rick Astley", "Whenever You Need Somebody", "6XhjNHCyCDyyGJRM5mg40G")
+
+    searches = [r for r in RequestsMockedSpotifyAPI.request_history if r.path.endswith("/search")]
+    assert len(searches) == 1
+    assert searches[0].qs["q"] == ['album:"whenever you need somebody" artist:"rick astley"']
+    assert searches[0].qs["limit"] == [str(spotify.search_limit)]
+
+
+def test_spotify_search_falls_back_to_looser_queries(MockedSpotifyAPI, RequestsMockedSpotifyAPI):
+    RequestsMockedSpotifyAPI.register_uri(
+        "GET",
+        re.compile("https://api.spotify.com/v1/search.*"),
+        [{"json": {"albums": {"items": []}}},
+         {"json": {"albums": {"items": []}}},
+         {"json": json.load(open(os.path.join(RESOURCES, "search.json")))}])
+
+    spotify = MockedSpotifyAPI
+    album = spotify.search_for_album("Whenever You Need Somebody", "Rick Astley")
+
+    assert album == SpotifyAlbum("Rick Astley", "Whenever You Need Somebody", "6XhjNHCyCDyyGJRM5mg40G")
+
+    searches = [r for r in RequestsMockedSpotifyAPI.request_history if r.path.endswith("/search")]
+    assert [s.qs["q"][0] for s in searches] == [
+        'album:"whenever you need somebody" artist:"rick astley"',
+        "album:whenever you need somebody artist:rick astley",
+        "whenever you need somebody rick astley",
+    ]
+
+
+def playlist_reads(rm):
+    return [r for r in rm.request_history if r.method == "GET" and r.path.endswith("/tracks")
+            and "/playlists/" in r.path]
+
+
+def test_spotify_playlist_read_is_skipped_when_snapshot_is_unchanged(MockedSpotifyAPI, RequestsMockedSpotifyAPI):
+    spotify = MockedSpotifyAPI
+    first = spotify.get_tracks_from_playlist()
+    second = spotify.get_tracks_from_playlist()
+
+    assert first == second
+    assert len(playlist_reads(RequestsMockedSpotifyAPI)) == 1
+
+
+def test_spotify_mirror_follows_writes_and_persists(AuthEnv, RequestsMockedSpotifyAPI, tmp_path):
+    path = str(tmp_path / "mirror.json")
+    spotify = Spotify(mirror_path=path)
+    tracks = spotify.get_tracks_from_playlist()
+
+    spotify.delete_tracks_from_playlist(tracks[:1])
+    assert spotify.mirror.snapshot_id == "snapshot-3"
+    assert spotify.mirror.tracks == tracks[1:]
+
+    new = SpotifyTrack("Rick Astley", "Never Gonna Give You Up", "4uLU6hMCjMI75M1A2tKUQC")
+    spotify.add_tracks_to_playlist([new])
+    assert spotify.mirror.snapshot_id == "snapshot-2"
+    assert spotify.mirror.tracks == tracks[1:] + [new]
+
+    # a later run picks the mirror up from disk
+    RequestsMockedSpotifyAPI.register_uri(
+        "GET",
+        re.compile(r"https://api.spotify.com/v1/playlists/[^/]*\?fields=snapshot_id"),
+        json={"snapshot_id": "snapshot-2"})
+    reads = len(playlist_reads(RequestsMockedSpotifyAPI))
+
+    assert Spotify(mirror_path=path).get_tracks_from_playlist() == tracks[1:] + [new]
+    assert len(playlist_reads(RequestsMockedSpotifyAPI)) == reads
+
+
+def test_spotify_mirror_is_refreshed_when_snapshot_changes(MockedSpotifyAPI, RequestsMockedSpotifyAPI):
+    spotify = MockedSpotifyAPI
+    spotify.mirror.update("stale-snapshot", [])
+
+    assert len(spotify.get_tracks_from_playlist()) == 3
+    assert spotify.mirror.snapshot_id == "snapshot-1"
+
+
+def test_spotify_search_strips_quotes_from_quoted_filters(MockedSpotifyAPI):
+    queries = MockedSpotifyAPI._album_search_queries('The "Heroes" Album', 'Some "Band"')
+
+    assert queries[0] == 'album:"The Heroes Album" artist:"Some Band"'
+
+
+def test_spotify_full_run_skips_the_next_playlist_read(MockedSpotifyAPI, RequestsMockedSpotifyAPI):
+    RequestsMockedSpotifyAPI.register_uri("PUT", re.compile("https://api.spotify.com/v1/playlists/[^/]*$"), json={})
+    spotify = MockedSpotifyAPI
+
+    # clear -> add -> describe, like a run of the handler
+    spotify.clear_playlist()
+    new = SpotifyTrack("Rick Astley", "Never Gonna Give You Up", "4uLU6hMCjMI75M1A2tKUQC")
+    spotify.add_tracks_to_playlist([new])
+    RequestsMockedSpotifyAPI.register_uri(
+        "GET",
+        re.compile(r"https://api.spotify.com/v1/playlists/[^/]*\?fields=snapshot_id"),
+        json={"snapshot_id": "snapshot-4"})
+    spotify.update_playlist_description("description")
+    assert spotify.mirror.snapshot_id == "snapshot-4"
+
+    # the next run's clear is served from the mirror
+    assert spotify.clear_playlist() == [new]
+    assert len(playlist_reads(RequestsMockedSpotifyAPI)) == 1
+
+
+def test_spotify_search_checks_each_single_only_once(MockedSpotifyAPI, RequestsMockedSpotifyAPI):
+    single = {"items": [{"artists": [{"name": "Rick Astley"}], "id": "1", "name": "Whenever You Need Somebody"}]}
+    RequestsMockedSpotifyAPI.register_uri("GET", re.compile("https://api.spotify.com/v1/albums.*"), json=single)
+
+    spotify = MockedSpotifyAPI
+    assert spotify.search_for_album("Whenever You Need Somebody", "Rick Astley") is None
+
+    searches = [r for r in RequestsMockedSpotifyAPI.request_history if r.path.endswith("/search")]
+    track_reads = [r for r in RequestsMockedSpotifyAPI.request_history if "/albums/" in r.path]
+    assert len(searches) == 3
+    assert len(track_reads) == 1